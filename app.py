@@ -1,13 +1,33 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request
 from werkzeug.utils import secure_filename
 import os
+import bisect
+import codecs
 import difflib
+import hashlib
+import io
+import math
+import mmap
 import re
-from collections import Counter
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from itertools import accumulate
+from operator import mul
+
+import diskcache
+import orjson
+
+try:
+    from rapidfuzz.distance import Indel
+except ImportError:  # fall back to the pure-Python difflib matcher
+    Indel = None
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
 app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['CACHE_FOLDER'] = 'cache'
+app.config['CACHE_SIZE_LIMIT'] = 1024 * 1024 * 1024  # 1GB
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 ALLOWED_EXTENSIONS = {
@@ -16,6 +36,42 @@ ALLOWED_EXTENSIONS = {
     'ts': 'TypeScript', 'tsx': 'TypeScript'
 }
 
+# Patterns are compiled once at import instead of on every request
+_RE_COMMENT = re.compile(r'//[^\n]*|#[^\n]*|/\*.*?\*/|"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'', re.DOTALL)
+_RE_SPACES = re.compile(r'[\t ]+')
+_RE_NEWLINES = re.compile(r'\n+')
+_RE_BRACES = re.compile(r'[{}()\[\]]')
+_BRACES_TO_SPACES = str.maketrans('{}()[]', '      ')
+_RE_TOKEN = re.compile(r'[A-Za-z_]\w*|\d+|[^\w\s]')
+# Every word, capturing it only when it looks like a random name (a1, tmp2, x99)
+_RE_WORD_RANDVAR = re.compile(r'\b([a-z]{1,2}\d+)\b|\b\w+\b')
+
+# Results of previous analyses, keyed by content digest (least recently used evicted first)
+RESULT_CACHE_SIZE = 512
+_similarity_cache = OrderedDict()
+_ai_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Finished analyses persisted across restarts and worker processes. Entries are keyed
+# by a fingerprint of this module's source and the matching backend, so any scoring
+# change, or switching between RapidFuzz and difflib, never serves stale results
+with open(__file__, 'rb') as _source:
+    SCORING_FINGERPRINT = hashlib.blake2b(
+        _source.read() + (b'rapidfuzz' if Indel is not None else b'difflib'), digest_size=16
+    ).hexdigest()
+_analysis_cache = diskcache.Cache(app.config['CACHE_FOLDER'], size_limit=app.config['CACHE_SIZE_LIMIT'])
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# Ratios whose upper bound falls below this are reported as the bound without matching
+RATIO_CUTOFF = 0.05
+
+# Inputs up to this combined length are matched exactly. Longer ones are anchored on
+# lines unique to both sides and the gaps matched exactly in chunks of RATIO_CHUNK_SIZE,
+# which keeps the same ratio (to within about 1%) at linear cost
+EXACT_RATIO_LIMIT = 200_000 if Indel is not None else 20_000
+RATIO_CHUNK_SIZE = 20_000
+
 # ------------------ Utilities ------------------
 
 def allowed_file(filename):
@@ -24,49 +80,194 @@ def allowed_file(filename):
 def get_file_extension(filename):
     return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
 
+def upload_buffer(stream):
+    """Zero-copy view of an uploaded file's bytes, or None if the stream can't be mapped."""
+    # Werkzeug spools uploads: small ones stay in a BytesIO, large ones roll over to a
+    # temp file. Calling fileno() on an unrolled spool would force it to disk, so rely
+    # on the private _rolled/_file attributes and stream the upload if they are missing.
+    if isinstance(stream, tempfile.SpooledTemporaryFile):
+        rolled = getattr(stream, '_rolled', None)
+        if rolled is False and isinstance(getattr(stream, '_file', None), io.BytesIO):
+            return stream._file.getbuffer()
+        if rolled is not True:
+            return None
+    elif isinstance(stream, io.BytesIO):
+        return stream.getbuffer()
+    try:
+        return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):  # no descriptor, or an empty file
+        return None
+
+def read_upload(file):
+    """Decode an uploaded file, returning (text, BLAKE2 digest of its bytes)."""
+    buffer = upload_buffer(file.stream)
+    if buffer is not None:
+        with buffer:
+            return str(buffer, 'utf-8', 'ignore'), hashlib.blake2b(buffer, digest_size=16).digest()
+
+    # Fall back to streaming the upload in chunks
+    hasher = hashlib.blake2b(digest_size=16)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    parts = []
+    while chunk := file.read(READ_CHUNK_SIZE):
+        hasher.update(chunk)
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts), hasher.digest()
+
+def cached(cache, key, compute, *args):
+    """Return the cached result for key, calling compute(*args) on a miss."""
+    with _cache_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    result = compute(*args)
+    with _cache_lock:
+        cache[key] = result
+        if len(cache) > RESULT_CACHE_SIZE:
+            cache.popitem(last=False)
+    return result
+
 def normalize_code(code):
     """Smart normalization: remove comments, compress whitespaces, fix braces/brackets."""
     # Remove single and multi-line comments
-    code = re.sub(r'//.*', '', code)
-    code = re.sub(r'#.*', '', code)
-    code = re.sub(r'/\*.*?\*/', '', code, flags=re.DOTALL)
-    code = re.sub(r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'', '', code, flags=re.DOTALL)
+    code = _RE_COMMENT.sub('', code)
     # Normalize braces and spacing
-    code = re.sub(r'[\t ]+', ' ', code)
-    code = re.sub(r'\n+', '\n', code)
-    code = re.sub(r'[{}()\[\]]', ' ', code)
+    code = _RE_SPACES.sub(' ', code)
+    code = _RE_NEWLINES.sub('\n', code)
+    # str.translate only beats the regex on pure-ASCII text
+    code = code.translate(_BRACES_TO_SPACES) if code.isascii() else _RE_BRACES.sub(' ', code)
     return code.strip()
 
 def tokenize(code):
     """Weighted tokenization by frequency — better than simple set matching."""
-    tokens = re.findall(r'[A-Za-z_]\w*|\d+|[^\w\s]', code)
-    token_counts = Counter(tokens)
-    total_count = sum(token_counts.values())
-    # Normalize frequencies to percentage
-    return {t: c / total_count for t, c in token_counts.items()} if total_count else {}
+    # Raw counts: cosine similarity is scale-invariant, so no need to normalize
+    return Counter(_RE_TOKEN.findall(code))
+
+def cosine_similarity(counts1, counts2):
+    """Cosine similarity of two token count profiles, computed with C-level builtins."""
+    norm = math.hypot(*counts1.values()) * math.hypot(*counts2.values())
+    if not norm:
+        return 0
+    # Only tokens present in both files contribute to the dot product
+    shared = counts1.keys() & counts2.keys()
+    dot = sum(map(mul, map(counts1.__getitem__, shared), map(counts2.__getitem__, shared)))
+    return dot / norm
+
+def exact_ratio(a, b):
+    """Exact similarity ratio of two sequences, using RapidFuzz when available."""
+    if Indel is not None:
+        return Indel.normalized_similarity(a, b)
+    matcher = difflib.SequenceMatcher(None, a, b)
+    quick_bound = matcher.quick_ratio()
+    if quick_bound < RATIO_CUTOFF:
+        return quick_bound
+    return matcher.ratio()
+
+def chunked_matches(a, b):
+    """Matched element count when proportional chunks of a and b are matched pairwise."""
+    if not a or not b:
+        return 0
+    chunks = -(-(len(a) + len(b)) // RATIO_CHUNK_SIZE)
+    step_a, step_b = len(a) / chunks, len(b) / chunks
+    matches = 0
+    for k in range(chunks):
+        chunk_a = a[round(k * step_a):round((k + 1) * step_a)]
+        chunk_b = b[round(k * step_b):round((k + 1) * step_b)]
+        matches += exact_ratio(chunk_a, chunk_b) * (len(chunk_a) + len(chunk_b)) / 2
+    return matches
+
+def unique_anchors(a, b):
+    """(start_a, start_b, size) of lines unique to both sides, in an order both agree on."""
+    if isinstance(a, str):
+        units_a, units_b, size = a.splitlines(True), b.splitlines(True), len
+    else:
+        units_a, units_b, size = a, b, lambda unit: 1
+    counts_a, counts_b = Counter(units_a), Counter(units_b)
+    index_b = {unit: j for j, unit in enumerate(units_b) if counts_b[unit] == 1}
+    pairs = [(i, index_b[unit]) for i, unit in enumerate(units_a)
+             if counts_a[unit] == 1 and unit in index_b]
+
+    # Longest chain increasing in both files (patience sorting), O(n log n)
+    tails, tail_pairs, previous = [], [], [None] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        slot = bisect.bisect_left(tails, j)
+        previous[k] = tail_pairs[slot - 1] if slot else None
+        if slot == len(tails):
+            tails.append(j)
+            tail_pairs.append(k)
+        else:
+            tails[slot] = j
+            tail_pairs[slot] = k
+    chain = []
+    k = tail_pairs[-1] if tail_pairs else None
+    while k is not None:
+        chain.append(pairs[k])
+        k = previous[k]
+
+    offsets_a = list(accumulate(map(size, units_a), initial=0))
+    offsets_b = list(accumulate(map(size, units_b), initial=0))
+    return [(offsets_a[i], offsets_b[j], size(units_a[i])) for i, j in reversed(chain)]
+
+def approximate_matches(a, b):
+    """Lower bound on the matched element count of two long sequences, in linear time."""
+    anchored = 0
+    pos_a = pos_b = 0
+    for start_a, start_b, size in unique_anchors(a, b):
+        anchored += chunked_matches(a[pos_a:start_a], b[pos_b:start_b]) + size
+        pos_a, pos_b = start_a + size, start_b + size
+    anchored += chunked_matches(a[pos_a:], b[pos_b:])
+    # Both are valid common subsequences; anchoring wins on edited copies, plain
+    # chunking on reordered or unrelated code where unique lines anchor poorly
+    return max(anchored, chunked_matches(a, b))
+
+def sequence_ratio(a, b):
+    """Similarity of two strings or lists in [0, 1], using RapidFuzz when available."""
+    if a == b:
+        return 1.0
+    # At most min(len) elements can match, which caps the ratio before any matching
+    upper_bound = 2 * min(len(a), len(b)) / (len(a) + len(b))
+    if upper_bound < RATIO_CUTOFF:
+        return upper_bound
+    if len(a) + len(b) > EXACT_RATIO_LIMIT:
+        return 2 * approximate_matches(a, b) / (len(a) + len(b))
+    return exact_ratio(a, b)
 
 def calculate_similarity(code1, code2):
     """Enhanced similarity metrics."""
+    # Identical uploads (a common self-check) need no matching at all
+    if code1 == code2 and code1.strip():
+        return {
+            'overall': 100.0,
+            'sequence': 100.0,
+            'normalized': 100.0,
+            'line_based': 100.0,
+            'token_based': 100.0
+        }
+
     # Sequence-level
-    seq_similarity = difflib.SequenceMatcher(None, code1, code2).ratio()
+    seq_similarity = sequence_ratio(code1, code2)
 
     # Normalization-level
     norm1 = normalize_code(code1)
     norm2 = normalize_code(code2)
-    norm_similarity = difflib.SequenceMatcher(None, norm1, norm2).ratio()
+    norm_similarity = sequence_ratio(norm1, norm2)
 
     # Line-level
     lines1 = [l.strip() for l in code1.splitlines() if l.strip()]
     lines2 = [l.strip() for l in code2.splitlines() if l.strip()]
-    line_similarity = difflib.SequenceMatcher(None, lines1, lines2).ratio()
+    # Map each distinct line to a small int so matching compares ints, not strings
+    line_ids = {}
+    ids1 = [line_ids.setdefault(l, len(line_ids)) for l in lines1]
+    ids2 = [line_ids.setdefault(l, len(line_ids)) for l in lines2]
+    line_similarity = sequence_ratio(ids1, ids2)
 
     # Token-level (frequency comparison via cosine similarity)
     tokens1, tokens2 = tokenize(code1), tokenize(code2)
-    all_tokens = set(tokens1.keys()) | set(tokens2.keys())
-    dot = sum(tokens1.get(t, 0) * tokens2.get(t, 0) for t in all_tokens)
-    mag1 = sum(v ** 2 for v in tokens1.values()) ** 0.5
-    mag2 = sum(v ** 2 for v in tokens2.values()) ** 0.5
-    token_similarity = dot / (mag1 * mag2) if mag1 and mag2 else 0
+    if tokens1 == tokens2:
+        token_similarity = 1.0 if tokens1 else 0
+    else:
+        token_similarity = cosine_similarity(tokens1, tokens2)
 
     # Weighted adaptive average
     n_lines = max(len(lines1), len(lines2))
@@ -88,54 +289,83 @@ def calculate_similarity(code1, code2):
 
 # ------------------ AI Detection ------------------
 
-def detect_ai_generated(code):
-    """Improved AI pattern detection."""
-    indicators = {
-        'comment_density': 0,
-        'naming_randomness': 0,
-        'indent_consistency': 0,
-        'readability_balance': 0,
-        'complexity': 0
-    }
-    lines = [l for l in code.splitlines() if l.strip()]
-    total_lines = len(lines)
-    if total_lines == 0:
-        return {'probability': 0, 'confidence': 'low', 'indicators': indicators}
-
-    # Comment density
-    comment_lines = len([l for l in lines if l.strip().startswith(('#', '//', '/*'))])
-    indicators['comment_density'] = round(comment_lines / total_lines * 100, 2)
-
-    # Naming randomness: presence of vars like a1, tmp2, x99
-    rand_vars = re.findall(r'\b[a-z]{1,2}\d+\b', code)
-    indicators['naming_randomness'] = min(len(rand_vars) * 8, 100)
-
-    # Indentation consistency
-    indents = [len(l) - len(l.lstrip()) for l in lines if l.startswith((' ', '\t'))]
-    if indents:
-        std_indent = len(set(indents))
-        indicators['indent_consistency'] = 80 if std_indent <= 3 else 40
-
-    # Readability balance: average line length
-    avg_len = sum(len(l) for l in lines) / total_lines
-    indicators['readability_balance'] = 100 - min(avg_len, 100) if avg_len > 60 else 70
-
-    # Complexity heuristic
-    token_count = len(re.findall(r'\b\w+\b', code))
-    indicators['complexity'] = 30 if token_count < 100 else 60 if token_count < 300 else 80
-
-    # Aggregate probability
-    probability = sum(indicators.values()) / (len(indicators) * 100) * 100
-    confidence = 'high' if probability > 70 else 'medium' if probability > 40 else 'low'
-
-    return {
-        'probability': round(probability, 2),
-        'confidence': confidence,
-        'indicators': indicators
-    }
+# Bucket tables: word count below 100 / 300 / above, probability up to 40 / 70 / above
+COMPLEXITY_EDGES = (100, 300)
+COMPLEXITY_SCORES = (30, 60, 80)
+CONFIDENCE_EDGES = (40, 70)
+CONFIDENCE_LEVELS = ('low', 'medium', 'high')
+
+# Line comment markers: '#' starts a comment in Python but a preprocessor
+# directive in the C family, which has no '#' comments
+COMMENT_PREFIXES = {ext: ('#',) if ext == 'py' else ('//', '/*') for ext in ALLOWED_EXTENSIONS}
+
+def make_detector(comment_prefixes):
+    """Build an AI detector specialized to one language's comment syntax."""
+    def detect_ai_generated(code):
+        """Improved AI pattern detection."""
+        indicators = {
+            'comment_density': 0,
+            'naming_randomness': 0,
+            'indent_consistency': 0,
+            'readability_balance': 0,
+            'complexity': 0
+        }
+        # Gather all per-line statistics in a single pass over non-blank lines
+        total_lines = comment_lines = total_len = 0
+        indents = set()
+        for line in code.splitlines():
+            body = line.lstrip()
+            if not body:
+                continue
+            total_lines += 1
+            total_len += len(line)
+            if body.startswith(comment_prefixes):
+                comment_lines += 1
+            if line[0] in ' \t':
+                indents.add(len(line) - len(body))
+        if total_lines == 0:
+            return {'probability': 0, 'confidence': 'low', 'indicators': indicators}
+
+        # Comment density
+        indicators['comment_density'] = round(comment_lines / total_lines * 100, 2)
+
+        # Naming randomness: presence of vars like a1, tmp2, x99
+        words = _RE_WORD_RANDVAR.findall(code)
+        rand_vars = len(words) - words.count('')
+        indicators['naming_randomness'] = min(rand_vars * 8, 100)
+
+        # Indentation consistency
+        if indents:
+            indicators['indent_consistency'] = 80 if len(indents) <= 3 else 40
+
+        # Readability balance: average line length
+        avg_len = total_len / total_lines
+        indicators['readability_balance'] = 100 - min(avg_len, 100) if avg_len > 60 else 70
+
+        # Complexity heuristic
+        token_count = len(words)
+        indicators['complexity'] = COMPLEXITY_SCORES[bisect.bisect_right(COMPLEXITY_EDGES, token_count)]
+
+        # Aggregate probability
+        probability = sum(indicators.values()) / (len(indicators) * 100) * 100
+        confidence = CONFIDENCE_LEVELS[bisect.bisect_left(CONFIDENCE_EDGES, probability)]
+
+        return {
+            'probability': round(probability, 2),
+            'confidence': confidence,
+            'indicators': indicators
+        }
+
+    return detect_ai_generated
+
+AI_DETECTORS = {ext: make_detector(prefixes) for ext, prefixes in COMMENT_PREFIXES.items()}
 
 # ------------------ Flask Routes ------------------
 
+def fast_jsonify(obj, status=200):
+    """JSON response encoded with orjson instead of the stdlib json module."""
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -144,47 +374,55 @@ def index():
 def analyze():
     try:
         if 'file1' not in request.files or 'file2' not in request.files:
-            return jsonify({'error': 'Both files are required'}), 400
+            return fast_jsonify({'error': 'Both files are required'}, 400)
 
         file1 = request.files['file1']
         file2 = request.files['file2']
 
         if file1.filename == '' or file2.filename == '':
-            return jsonify({'error': 'Please select both files'}), 400
+            return fast_jsonify({'error': 'Please select both files'}, 400)
 
         ext1 = get_file_extension(file1.filename)
         ext2 = get_file_extension(file2.filename)
 
         if not allowed_file(file1.filename) or not allowed_file(file2.filename):
-            return jsonify({
+            return fast_jsonify({
                 'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS.keys())}'
-            }), 400
+            }, 400)
 
         if ext1 != ext2:
-            return jsonify({
+            return fast_jsonify({
                 'error': f'File extensions must match. Got: .{ext1} and .{ext2}'
-            }), 400
-
-        code1 = file1.read().decode('utf-8', errors='ignore')
-        code2 = file2.read().decode('utf-8', errors='ignore')
-
-        similarity = calculate_similarity(code1, code2)
-        ai_detection1 = detect_ai_generated(code1)
-        ai_detection2 = detect_ai_generated(code2)
+            }, 400)
+
+        code1, digest1 = read_upload(file1)
+        code2, digest2 = read_upload(file2)
+
+        analysis_key = (SCORING_FINGERPRINT, ext1, digest1, digest2)
+        analysis = _analysis_cache.get(analysis_key)
+        if analysis is None:
+            # Order-independent key so (a, b) and (b, a) share an entry
+            pair_key = (min(digest1, digest2), max(digest1, digest2))
+            detect = AI_DETECTORS[ext1]
+            analysis = {
+                'similarity': cached(_similarity_cache, pair_key, calculate_similarity, code1, code2),
+                'ai_detection': {
+                    'file1': cached(_ai_cache, (ext1, digest1), detect, code1),
+                    'file2': cached(_ai_cache, (ext2, digest2), detect, code2)
+                }
+            }
+            _analysis_cache.set(analysis_key, analysis)
 
-        return jsonify({
+        return fast_jsonify({
             'success': True,
             'language': ALLOWED_EXTENSIONS[ext1],
             'extension': ext1,
-            'similarity': similarity,
-            'ai_detection': {
-                'file1': ai_detection1,
-                'file2': ai_detection2
-            }
+            'similarity': analysis['similarity'],
+            'ai_detection': analysis['ai_detection']
         })
 
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return fast_jsonify({'error': str(e)}, 500)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
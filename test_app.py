@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+import app
+
+
+def make_source(seed, length):
+    """Deterministic code-like text of the given length."""
+    rng = random.Random(seed)
+    names = ['value', 'items', 'result', 'index', 'count', 'node', 'buffer', 'total']
+    lines = []
+    size = 0
+    while size < length:
+        indent = '    ' * rng.randint(0, 3)
+        line = f'{indent}{rng.choice(names)}_{rng.randint(0, 999)} = ' \
+               f'{rng.choice(names)}({rng.choice(names)}, {rng.randint(0, 99)})\n'
+        lines.append(line)
+        size += len(line)
+    return ''.join(lines)[:length]
+
+
+def edit(text, fraction, seed=0):
+    """Copy of text with the given fraction of characters replaced."""
+    rng = random.Random(seed)
+    chars = list(text)
+    for i in rng.sample(range(len(chars)), int(len(chars) * fraction)):
+        chars[i] = rng.choice('abcxyz_ ')
+    return ''.join(chars)
+
+
+@pytest.mark.parametrize('other', [
+    lambda text: edit(text, 0.02),
+    lambda text: make_source(2, len(text)),
+], ids=['edited-copy', 'unrelated'])
+def test_sequence_ratio_continuous_across_exact_limit(other):
+    if app.Indel is None:
+        pytest.skip("difflib's autojunk makes its ratio depend on input size on its own")
+    half = app.EXACT_RATIO_LIMIT // 2
+    code = make_source(1, half + 1)
+    copy = other(code)
+    below = app.sequence_ratio(code[:half - 1], copy[:half - 1])
+    above = app.sequence_ratio(code, copy)
+    assert abs(below - above) < 0.02
+
+
+def test_c_preprocessor_lines_are_not_comments():
+    code = '#include <stdio.h>\n// entry point\nint main() {\n    return 0;\n}\n'
+    assert app.AI_DETECTORS['c'](code)['indicators']['comment_density'] == 20.0
+    assert app.AI_DETECTORS['py']('# note\nvalue = 1\n')['indicators']['comment_density'] == 50.0